@@ -1,15 +1,30 @@
 import os
 import time
-import io
 import logging
+import asyncio
+import atexit
+import functools
+import hashlib
+import heapq
+import json
+import mimetypes
+import re
+import queue
+import shutil
+import sqlite3
+import threading
 from datetime import datetime
-from openai import OpenAI
+from logging.handlers import QueueHandler, QueueListener
+from types import SimpleNamespace
+from aiolimiter import AsyncLimiter
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload, build_http, set_user_agent
 from docx import Document
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
+import pymupdf
 from dotenv import load_dotenv
 from video_processor import VideoProcessor
 import tempfile
@@ -18,41 +33,124 @@ import sys
 # Video folder configuration
 VIDEO_FOLDERS = {}
 
+# Configuration snapshot, set by load_environment()
+CFG = None
+
+# OpenAI request limits
+TRANSLATION_CONCURRENCY = 8
+TRANSLATION_REQUESTS_PER_MINUTE = 60
+DEFAULT_TRANSLATION_MODEL = "gpt-4o-mini"
+BATCH_POLL_INTERVAL = 60  # seconds
+PAGE_MARKER_INSTRUCTIONS = "Keep every <<<PAGE n>>> line exactly as it is."
+PAGE_MARKER_PATTERN = re.compile(r"^\s*<<<PAGE (\d+)>>>\s*$", re.MULTILINE)
+SUBTITLE_EXTENSIONS = ('.srt', '.vtt')
+SUBTITLE_LINE_INSTRUCTIONS = ("Translate each line on its own and return exactly one line "
+                              "per input line, in the same order.")
+SUBTITLE_STRUCTURE_PATTERN = re.compile(r"^\ufeff?(\d+|WEBVTT.*|.*-->.*)\s*$")
+PDF_GROUP_LINES = 125  # Lines of PDF text translated per request
+PDF_PIPELINE_DEPTH = 4
+PDF_TRANSLATORS = 2
+
+# Google Drive transfer settings
+DOWNLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+SIMPLE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+UPLOAD_MIME_TYPES = {
+    '.srt': 'application/x-subrip',
+    '.vtt': 'text/vtt',
+}
+
+# Concurrent file processing
+TEXT_WORKERS = 4
+VIDEO_WORKERS = 2  # Transcription is serialized; extra workers overlap Drive transfers
+
+# Polling configuration (seconds)
+CHANGES_POLL_INTERVAL = 5
+FULL_SCAN_INTERVAL = 600
+
+# Per-file working directories for text downloads and their translations
+DOWNLOADS_DIR = os.path.join(os.getcwd(), "Data", "Downloads")
+
+# Persistent cache of translated chunks
+TRANSLATION_CACHE_PATH = os.path.join(os.getcwd(), "Data", ".translate_cache.sqlite")
+_translation_cache = None
+
+# Processed file IDs and the changes token, kept across restarts
+STATE_DIR = os.path.join(os.getcwd(), "Data", ".state")
+PROCESSED_FILES_PATH = os.path.join(STATE_DIR, "processed.json")
+PROCESSED_LOG_PATH = os.path.join(STATE_DIR, "processed.log")
+CHANGES_TOKEN_PATH = os.path.join(STATE_DIR, "changes_token")
+PROCESSED_COMPACT_EVERY = 100  # Log entries before processed.json is rewritten
+_processed_log_entries = 0
+
+# Per-thread Google Drive services (httplib2 connections are not thread-safe)
+_drive_local = threading.local()
+_folder_lock = threading.Lock()
+
+# Log records are queued and written by a background thread so that
+# console and file I/O never block the workers
+_log_handlers = [
+    logging.StreamHandler(sys.stdout),
+    logging.FileHandler('translator.log')
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+_log_queue = queue.Queue(-1)
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Final formatting happens in the listener
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('translator.log')
-    ]
+    handlers=[_queue_handler]
 )
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-def check_existing_translation(file_name, service, output_folder_id):
-    """Check if a translated version already exists"""
-    base_without_ext = os.path.splitext(file_name)[0]
-    translated_name = f"{base_without_ext}_AI_Translated.srt"
-    
-    logger.info(f"Checking for existing translation: {translated_name}")
-    
-    query = f"name='{translated_name}' and '{output_folder_id}' in parents and trashed=false"
-    try:
-        results = service.files().list(
-            q=query,
-            fields="files(id, name)",
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True
-        ).execute()
-        
-        if results.get('files', []):
-            logger.info(f"Found existing translation: {translated_name}")
-            return True
-            
-        logger.info("No existing translation found")
-        return False
-    except Exception as e:
-        logger.error(f"Error checking for existing translation: {e}")
-        return True  # Safer to assume it exists if we can't check
+def find_existing_translations(file_names, output_folder_id):
+    """Check which of file_names already have a translation.
+
+    Returns a dict mapping each file name that should not be translated now
+    to True if its translation exists, or None if the check failed. The
+    existence checks are sent as Drive batch requests of up to 100 queries
+    each instead of one files.list call per file.
+    """
+    file_names = list(file_names)
+    existing = {}
+
+    def handle_response(request_id, response, exception):
+        file_name = file_names[int(request_id)]
+        if exception:
+            logger.error(f"Error checking for existing translation of {file_name}: {exception}")
+            existing[file_name] = None  # Safer to skip for now if we can't check
+        elif response.get('files', []):
+            logger.info(f"Found existing translation for {file_name}")
+            existing[file_name] = True
+
+    service = drive_service()
+    for start in range(0, len(file_names), 100):
+        batch = service.new_batch_http_request(callback=handle_response)
+        for i, file_name in enumerate(file_names[start:start + 100], start):
+            translated_name = f"{os.path.splitext(file_name)[0]}_AI_Translated.srt"
+            query = f"name='{translated_name}' and '{output_folder_id}' in parents and trashed=false"
+            batch.add(
+                service.files().list(
+                    q=query,
+                    pageSize=1,
+                    fields="files(id)",
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True
+                ),
+                request_id=str(i)
+            )
+        try:
+            batch.execute()
+        except Exception as e:
+            logger.error(f"Error checking for existing translations: {e}")
+            existing.update(dict.fromkeys(file_names[start:start + 100]))
+
+    return existing
 
 def is_video_file(mime_type):
     """Check if a file is a video based on its MIME type."""
@@ -66,97 +164,167 @@ def is_video_file(mime_type):
     ]
     return any(mime_type.startswith(vtype) for vtype in video_mime_types)
 
-# Print startup banner
-logger.info("=" * 50)
-logger.info("Starting Auto Google Drive Translator")
-logger.info("=" * 50)
-
-# Load environment variables
-logger.info("Loading environment variables...")
-load_dotenv()
-
-# Initialize OpenAI
-logger.info("Initializing OpenAI client...")
-api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
-    logger.error("OpenAI API key not found in environment variables!")
-    sys.exit(1)
-
-if not api_key.startswith('sk-') or len(api_key) < 20:
-    logger.error("OpenAI API key appears to be invalid! Please check your .env file.")
-    sys.exit(1)
-
-try:
-    client = OpenAI(
-        api_key=api_key,
+@functools.lru_cache(None)
+def get_openai():
+    """Return the shared OpenAI client, creating it on first use."""
+    logger.info("Initializing OpenAI client...")
+    client = AsyncOpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
         base_url="https://api.openai.com/v1",
-        timeout=60.0
+        timeout=60.0,
+        # Reuse HTTP/2 connections across chunks instead of new TLS handshakes
+        http_client=DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
     )
     logger.info("OpenAI client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize OpenAI client: {e}")
-    sys.exit(1)
+    return client
 
-# Setup Google Drive API
-logger.info("Setting up Google Drive API...")
+# Google Drive API
 SCOPES = ['https://www.googleapis.com/auth/drive']
 SERVICE_ACCOUNT_FILE = './credentials/credentials.json'
+DRIVE_USER_AGENT = 'ATGT (gzip)'
+
+def build_drive_service():
+    """Build a Drive service that asks for gzip-compressed responses.
+
+    httplib2 already sends Accept-Encoding: gzip, but Google only compresses
+    responses for clients whose User-Agent contains "gzip". The API client
+    adds that for JSON calls; setting it on the transport also covers media
+    downloads and batch requests.
+    """
+    # build_http keeps the client's socket timeout and 308 handling for resumable uploads
+    http = AuthorizedHttp(get_credentials(), http=build_http())
+    set_user_agent(http, DRIVE_USER_AGENT)
+    return build('drive', 'v3', http=http)
 
-try:
-    credentials = service_account.Credentials.from_service_account_file(
+@functools.lru_cache(None)
+def get_credentials():
+    """Return the service account credentials, loading them on first use."""
+    return service_account.Credentials.from_service_account_file(
         SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    service = build('drive', 'v3', credentials=credentials)
-    logger.info("Google Drive API setup completed successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Google Drive API: {e}")
-    sys.exit(1)
-
-def list_files(folder_id, suffix=None):
-    """List all files in the specified Google Drive folder."""
+
+def drive_service():
+    """Return the Google Drive service for the calling thread."""
+    if not hasattr(_drive_local, 'service'):
+        _drive_local.service = build_drive_service()
+    return _drive_local.service
+
+def list_folders(folder_ids, mime_type=None):
+    """List the files of several Google Drive folders with a single query.
+
+    When mime_type is given, only files whose MIME type contains it are
+    listed, so the filtering happens on the Drive side.
+
+    Returns a dict mapping each folder ID to the files it contains.
+    """
+    files_by_folder = {folder_id: [] for folder_id in folder_ids if folder_id}
+    if not files_by_folder:
+        return files_by_folder
+
     try:
-        query = f"'{folder_id}' in parents and trashed=false"
-        if suffix:
-            query += f" and name ends with '{suffix}'"
-        
-        results = service.files().list(
-            q=query,
-            pageSize=100,
-            fields="files(id, name, mimeType)",
-            orderBy="name"
-        ).execute()
-        
-        folder_name = "Unknown Folder"
-        folder_names = {
-            os.getenv('VIDEO_DUTCH_FOLDER_ID'): "Dutch Videos",
-            os.getenv('VIDEO_GERMAN_FOLDER_ID'): "German Videos",
-            os.getenv('VIDEO_ENGLISH_FOLDER_ID'): "English Videos",
-            os.getenv('VIDEO_OTHER_FOLDER_ID'): "Other Videos",
-            os.getenv('OUTPUT_FOLDER_ID'): "Output",
-            os.getenv('TEXT_TRANSLATION_FOLDER_ID'): "Translation Queue"
-        }
-        folder_name = folder_names.get(folder_id, folder_id)
-        files = results.get('files', [])
-        logger.info(f"Found {len(files)} files in {folder_name}")
-        return files
+        parents_query = " or ".join(f"'{folder_id}' in parents" for folder_id in files_by_folder)
+        query = f"({parents_query}) and trashed=false"
+        if mime_type:
+            query += f" and mimeType contains '{mime_type}'"
+        page_token = None
+        while True:
+            results = drive_service().files().list(
+                q=query,
+                pageSize=1000,
+                fields="nextPageToken, files(id, name, mimeType, parents)",
+                orderBy="name",
+                pageToken=page_token
+            ).execute()
+
+            for file in results.get('files', []):
+                for parent_id in file.get('parents', []):
+                    if parent_id in files_by_folder:
+                        files_by_folder[parent_id].append(file)
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        total = sum(len(files) for files in files_by_folder.values())
+        logger.info(f"Found {total} files in {len(files_by_folder)} folders")
+        return files_by_folder
+    except Exception as e:
+        logger.error(f"Error listing folders: {e}")
+        return {folder_id: [] for folder_id in files_by_folder}
+
+def get_changes_start_token():
+    """Get the Drive changes page token marking the current point in time."""
+    try:
+        return drive_service().changes().getStartPageToken(fields="startPageToken").execute().get('startPageToken')
+    except Exception as e:
+        logger.error(f"Error getting changes start token: {e}")
+        return None
+
+def list_changes(page_token, folder_ids):
+    """List files added or changed in the given folders since page_token.
+
+    Returns the changed files grouped by folder ID, like list_folders, and
+    the page token to pass on the next call. On error the original token is
+    returned so the changes are fetched again.
+    """
+    files_by_folder = {folder_id: [] for folder_id in folder_ids if folder_id}
+    next_token = page_token
+    try:
+        while True:
+            results = drive_service().changes().list(
+                pageToken=next_token,
+                pageSize=1000,
+                fields="nextPageToken, newStartPageToken, "
+                       "changes(removed, file(id, name, mimeType, parents, trashed))"
+            ).execute()
+
+            for change in results.get('changes', []):
+                file = change.get('file')
+                if change.get('removed') or not file or file.get('trashed'):
+                    continue
+                for parent_id in file.get('parents', []):
+                    if parent_id in files_by_folder:
+                        files_by_folder[parent_id].append(file)
+
+            if 'newStartPageToken' in results:
+                next_token = results['newStartPageToken']
+                break
+            next_token = results['nextPageToken']
+
+        total = sum(len(files) for files in files_by_folder.values())
+        if total:
+            logger.info(f"Found {total} changed files")
+        return files_by_folder, next_token
     except Exception as e:
-        logger.error(f"Error listing files in {folder_name}: {e}")
-        return []
+        logger.error(f"Error listing changes: {e}")
+        return {folder_id: [] for folder_id in files_by_folder}, page_token
 
 def download_file(file_id, file_name):
-    """Download a file from Google Drive."""
+    """Download a file from Google Drive.
+
+    Each file gets its own directory under Data/Downloads, keyed on the Drive
+    file ID, so same-named files from different folders never share paths.
+    The translated file is written next to the download.
+    """
     logger.info(f"Downloading file: {file_name}")
-    data_folder = os.path.join(os.getcwd(), "Data")
+    data_folder = os.path.join(DOWNLOADS_DIR, file_id)
     os.makedirs(data_folder, exist_ok=True)
     file_path = os.path.join(data_folder, file_name)
     
     try:
-        request = service.files().get_media(fileId=file_id)
+        request = drive_service().files().get_media(fileId=file_id)
         with open(file_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
+            downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_SIZE)
             done = False
+            last_logged = -1
             while not done:
                 status, done = downloader.next_chunk()
-                logger.info(f"Download progress: {int(status.progress() * 100)}%")
+                progress = int(status.progress() * 100)
+                if progress // 10 > last_logged:  # Log every 10%
+                    last_logged = progress // 10
+                    logger.info(f"Download progress: {progress}%")
         logger.info(f"Successfully downloaded {file_name}")
         return file_path
     except Exception as e:
@@ -165,38 +333,393 @@ def download_file(file_id, file_name):
             os.remove(file_path)
         return None
 
-def translate_text(text):
-    """Translate text using OpenAI's API."""
+@functools.lru_cache(None)
+def translation_gate():
+    """Return the shared concurrency semaphore and rate limiter, creating them on first use."""
+    return (
+        asyncio.Semaphore(TRANSLATION_CONCURRENCY),
+        AsyncLimiter(TRANSLATION_REQUESTS_PER_MINUTE, 60)
+    )
+
+def get_translation_cache():
+    """Open the translation cache database, creating it on first use."""
+    global _translation_cache
+    if _translation_cache is None:
+        os.makedirs(os.path.dirname(TRANSLATION_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(TRANSLATION_CACHE_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)")
+        conn.commit()
+        _translation_cache = conn
+    return _translation_cache
+
+def translation_cache_key(model, system_prompt, chunk_text):
+    """Build the cache key for a chunk translated with the given model and prompt."""
+    return hashlib.blake2b(f"{model}|{system_prompt}|{chunk_text}".encode()).hexdigest()
+
+def get_cached_translation(key):
+    """Return a previously translated chunk, or None if it is not cached."""
+    try:
+        row = get_translation_cache().execute(
+            "SELECT value FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.warning(f"Translation cache lookup failed: {e}")
+        return None
+
+def store_cached_translation(key, value):
+    """Save a translated chunk in the cache."""
     try:
-        logger.info("Starting text translation")
+        conn = get_translation_cache()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, value))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Translation cache update failed: {e}")
+
+def translation_request(model, system_prompt, chunk_text):
+    """Build the chat completion parameters for translating one chunk.
+
+    The system message is kept byte-identical for every chunk, with anything
+    that varies per chunk or per file in the user message after any fixed
+    instructions. OpenAI only caches prompt prefixes of 1024 tokens or more,
+    so at the current prompt size nothing is cached; the ordering only matters
+    if the fixed instructions grow past that.
+    """
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": chunk_text}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 2000
+    }
+
+async def translate_chunks_batch(model, system_prompt, chunk_texts):
+    """Translate chunks through the OpenAI Batch API.
+
+    Returns the raw model output for each chunk, in input order.
+    """
+    batch_lines = [
+        json.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": translation_request(model, system_prompt, chunk_text)
+        })
+        for i, chunk_text in enumerate(chunk_texts)
+    ]
+    batch_input = await get_openai().files.create(
+        file=("translation_batch.jsonl", "\n".join(batch_lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = await get_openai().batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    logger.info(f"Submitted translation batch {batch.id} with {len(chunk_texts)} chunks")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await get_openai().batches.retrieve(batch.id)
+        logger.info(f"Translation batch {batch.id} status: {batch.status}")
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise Exception(f"Translation batch {batch.id} ended with status {batch.status}")
+
+    output = await get_openai().files.content(batch.output_file_id)
+    results = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if response.get("status_code") != 200:
+            raise Exception(f"Batch request {item.get('custom_id')} failed: {item.get('error')}")
+        results[int(item["custom_id"])] = response["body"]["choices"][0]["message"]["content"]
+
+    return [results[i] for i in range(len(chunk_texts))]
+
+async def translate_many(texts, instructions=None):
+    """Translate several texts of one file as a single unit of work.
+
+    The chunks of all texts are looked up in the cache together, and the
+    untranslated ones go through the Batch API when there are at least
+    OPENAI_BATCH_MIN_CHUNKS of them, or as concurrent chat completions
+    otherwise. Optional instructions are prepended to every chunk's user
+    message. Returns one translation per text, in order, with None for a
+    text whose translation failed.
+    """
+    logger.info("Starting text translation")
+    model = CFG.translation_model
+    system_prompt = CFG.system_prompt
+    batch_min_chunks = CFG.batch_min_chunks
+
+    chunks, owners = [], []  # owners[i] is the index of the text chunk i belongs to
+    for text_index, text in enumerate(texts):
         lines = text.split("\n")
-        chunks = [lines[i:i+125] for i in range(0, len(lines), 125)]
-        translated_chunks = []
-
-        for i, chunk in enumerate(chunks, 1):
-            logger.info(f"Translating chunk {i}/{len(chunks)}")
-            chunk_text = "\n".join(chunk)
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": os.getenv('SYSTEM_PROMPT', "You are a helpful translation assistant.")},
-                    {"role": "user", "content": chunk_text}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
-            translated_text = response.choices[0].message.content
-            translated_text = translated_text.replace("```plaintext", "").replace("```", "")
-            translated_chunks.append(translated_text)
-            time.sleep(1)  # Rate limiting
+        for i in range(0, len(lines), 125):
+            chunk = "\n".join(lines[i:i+125])
+            chunks.append(f"{instructions}\n\n{chunk}" if instructions else chunk)
+            owners.append(text_index)
+
+    cache_keys = [translation_cache_key(model, system_prompt, chunk) for chunk in chunks]
+    translated_chunks = [get_cached_translation(key) for key in cache_keys]
+    missing = [i for i, translated in enumerate(translated_chunks) if translated is None]
+    if len(missing) < len(chunks):
+        logger.info(f"Using cached translations for {len(chunks) - len(missing)}/{len(chunks)} chunks")
+
+    semaphore, limiter = translation_gate()
+    prompt_tokens = cached_tokens = 0
+
+    async def translate_chunk(i):
+        nonlocal prompt_tokens, cached_tokens
+        async with semaphore:
+            async with limiter:
+                logger.debug("Translating chunk %d/%d", i + 1, len(chunks))
+                response = await get_openai().chat.completions.create(
+                    **translation_request(model, system_prompt, chunks[i])
+                )
+        if response.usage:
+            details = response.usage.prompt_tokens_details
+            prompt_tokens += response.usage.prompt_tokens
+            cached_tokens += (details.cached_tokens or 0) if details else 0
+        return response.choices[0].message.content
 
+    if missing and batch_min_chunks and len(missing) >= batch_min_chunks:
+        try:
+            results = await translate_chunks_batch(model, system_prompt, [chunks[i] for i in missing])
+        except Exception as e:
+            logger.error(f"Translation error: {e}")
+            return [None] * len(texts)
+    else:
+        # gather() returns results in submission order, so chunks stay in sequence
+        results = await asyncio.gather(*(translate_chunk(i) for i in missing), return_exceptions=True)
+
+    for i, translated_text in zip(missing, results):
+        if isinstance(translated_text, BaseException):
+            logger.error(f"Translation error: {translated_text}")
+            continue
+        translated_text = translated_text.replace("```plaintext", "").replace("```", "")
+        store_cached_translation(cache_keys[i], translated_text)
+        translated_chunks[i] = translated_text
+
+    if prompt_tokens:
+        logger.info(f"OpenAI reported {cached_tokens}/{prompt_tokens} prompt tokens as cached")
+
+    parts = [[] for _ in texts]
+    failed = set()
+    for text_index, translated_text in zip(owners, translated_chunks):
+        if translated_text is None:
+            failed.add(text_index)
+        else:
+            parts[text_index].append(translated_text)
+    if not failed:
         logger.info("Translation completed successfully")
-        return "\n".join(translated_chunks)
-    except Exception as e:
-        logger.error(f"Translation error: {e}")
-        return None
+    return [None if i in failed else "\n".join(text_parts) for i, text_parts in enumerate(parts)]
+
+async def translate_text(text, instructions=None):
+    """Translate text using OpenAI's API, or return None if it fails."""
+    return (await translate_many([text], instructions))[0]
+
+async def translate_texts(texts):
+    """Translate several texts of one file, keeping their order."""
+    return await translate_many(texts)
+
+async def translate_subtitles(text):
+    """Translate an SRT/VTT file, sending each distinct caption line only once.
 
-def translate_file(file_path, mime_type):
+    Cue numbers, timestamps and blank lines are copied as-is and never sent
+    to the model. If the model does not return one line per caption line,
+    the whole file is translated as plain text instead.
+    """
+    lines = text.split("\n")
+    unique_lines = list(dict.fromkeys(
+        line for line in lines
+        if line.strip() and not SUBTITLE_STRUCTURE_PATTERN.match(line)
+    ))
+    if not unique_lines:
+        return text
+    logger.info(f"Translating {len(unique_lines)} unique subtitle lines out of {len(lines)}")
+
+    groups = [unique_lines[i:i+125] for i in range(0, len(unique_lines), 125)]
+    results = await translate_many(["\n".join(group) for group in groups],
+                                   instructions=SUBTITLE_LINE_INSTRUCTIONS)
+
+    translations = {}
+    for group, translated in zip(groups, results):
+        if translated is None:
+            return None
+        translated_lines = translated.strip("\n").split("\n")
+        if len(translated_lines) != len(group):
+            logger.warning("Subtitle line count changed in translation, translating full text instead")
+            return await translate_text(text)
+        translations.update(zip(group, translated_lines))
+
+    return "\n".join(translations.get(line, line) for line in lines)
+
+def join_pages(page_texts):
+    """Join PDF pages into one text with a <<<PAGE n>>> line before each page."""
+    return "\n".join(f"<<<PAGE {n}>>>\n{text}" for n, text in enumerate(page_texts, 1))
+
+async def translate_pages(page_texts):
+    """Translate PDF pages in a single pass, keeping page boundaries."""
+    translated = await translate_text(join_pages(page_texts), instructions=PAGE_MARKER_INSTRUCTIONS)
+    return await split_pages(page_texts, translated)
+
+async def split_pages(page_texts, translated):
+    """Split the translation of join_pages(page_texts) back into pages.
+
+    If the model dropped any marker, the pages are translated one by one
+    instead.
+    """
+    if translated is None:
+        return [None] * len(page_texts)
+
+    parts = PAGE_MARKER_PATTERN.split(translated)
+    pages = {int(n): text.strip("\n") for n, text in zip(parts[1::2], parts[2::2])}
+    page_numbers = range(1, len(page_texts) + 1)
+    if sorted(pages) == list(page_numbers):
+        return [pages[n] for n in page_numbers]
+
+    logger.warning("Page markers were not preserved, translating pages individually")
+    return await translate_texts(page_texts)
+
+def add_pdf_text_pages(doc, text, fontsize=11):
+    """Lay text out on new pages of doc, wrapped within 72pt margins.
+
+    Text that does not fit on a page continues on the next one. If a page
+    takes nothing at all (e.g. a word wider than the margins), the font is
+    shrunk for the rest of the text, so no text is ever dropped. Blank
+    lines left over at the end do not start another page.
+    """
+    while text.strip():
+        page = doc.new_page()
+        writer = pymupdf.TextWriter(page.rect)
+        overflow = writer.fill_textbox(page.rect + (72, 72, -72, -72), text, fontsize=fontsize)
+        remaining = "\n".join(line for line, _ in overflow)
+        # Nothing fitted on this page (a blank remainder ends the loop instead)
+        stuck = bool(remaining.strip()) and remaining.split() == text.split()
+        if stuck and fontsize > 4:
+            doc.delete_page(-1)
+            fontsize -= 1
+            continue
+        if stuck:
+            raise ValueError("Translated text does not fit on a PDF page")
+        writer.write_text(page)
+        text = remaining
+
+async def pdf_page_groups(doc):
+    """Yield the non-blank pages of doc in groups of roughly one translation chunk.
+
+    PyMuPDF is not thread-safe, so extraction stays on the event loop thread
+    and yields between pages instead.
+    """
+    group, group_lines = [], 0
+    for page_num, page in enumerate(doc, 1):
+        logger.debug("Processing PDF page %d/%d", page_num, doc.page_count)
+        text = page.get_text("text")
+        await asyncio.sleep(0)  # Let translation requests run
+        if not text.strip():
+            continue
+        # join_pages adds a <<<PAGE n>>> line before each page
+        page_lines = text.count("\n") + 2
+        if group and group_lines + page_lines > PDF_GROUP_LINES:
+            yield group
+            group, group_lines = [], 0
+        group.append(text)
+        group_lines += page_lines
+    if group:
+        yield group
+
+def add_translated_pages(out, translated_pages):
+    """Lay a group of translated pages out at the end of out."""
+    for translated_text in translated_pages:
+        if translated_text:
+            add_pdf_text_pages(out, translated_text)
+
+def save_translated_pdf(out, new_file_path):
+    """Save the translated document and close it."""
+    if not out.page_count:
+        out.new_page()  # PDF output needs at least one page
+    out.save(new_file_path, garbage=3, deflate=True)
+    out.close()
+
+async def translate_pdf(file_path, new_file_path):
+    """Translate a PDF as an extract -> translate -> write pipeline.
+
+    Groups are translated while later pages are still being extracted, and
+    written to the output in page order. When OPENAI_BATCH_MIN_CHUNKS is
+    set, all pages are extracted first so the batch decision can be made
+    for the whole file; a file with enough groups is then translated in
+    one pass.
+    """
+    with pymupdf.open(file_path) as doc:
+        groups = pdf_page_groups(doc)
+        if CFG.batch_min_chunks:
+            extracted = [group async for group in groups]
+            if len(extracted) >= CFG.batch_min_chunks:
+                results = await translate_many([join_pages(group) for group in extracted],
+                                               instructions=PAGE_MARKER_INSTRUCTIONS)
+                out = pymupdf.open()
+                for group, translated in zip(extracted, results):
+                    add_translated_pages(out, await split_pages(group, translated))
+                save_translated_pdf(out, new_file_path)
+                return
+
+            async def extracted_groups():
+                for group in extracted:
+                    yield group
+            groups = extracted_groups()
+
+        await translate_pdf_pipeline(groups, new_file_path)
+
+async def translate_pdf_pipeline(groups, new_file_path):
+    """Translate page groups concurrently as they arrive and save them in order."""
+    page_groups = asyncio.Queue(maxsize=PDF_PIPELINE_DEPTH)
+    translated_groups = asyncio.Queue()
+
+    async def page_producer():
+        group_index = 0
+        async for group in groups:
+            await page_groups.put((group_index, group))
+            group_index += 1
+        for _ in range(PDF_TRANSLATORS):
+            await page_groups.put(None)
+
+    async def translator():
+        while (item := await page_groups.get()) is not None:
+            group_index, page_texts = item
+            await translated_groups.put((group_index, await translate_pages(page_texts)))
+        await translated_groups.put(None)
+
+    async def page_writer():
+        # Lay every translated page out in one document, saved once at the end
+        out = pymupdf.open()
+        pending, next_index, finished = [], 0, 0
+        while finished < PDF_TRANSLATORS:
+            item = await translated_groups.get()
+            if item is None:
+                finished += 1
+                continue
+            heapq.heappush(pending, item)
+            while pending and pending[0][0] == next_index:
+                add_translated_pages(out, heapq.heappop(pending)[1])
+                next_index += 1
+        save_translated_pdf(out, new_file_path)
+
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(page_producer())
+            for _ in range(PDF_TRANSLATORS):
+                tasks.create_task(translator())
+            tasks.create_task(page_writer())
+    except ExceptionGroup as e:
+        raise e.exceptions[0]  # Report the original error, not the group
+
+async def translate_file(file_path, mime_type):
     """Translate file content based on mime type."""
     logger.info(f"Starting file translation for {file_path}")
     try:
@@ -209,41 +732,25 @@ def translate_file(file_path, mime_type):
             logger.info("Processing Word document")
             doc = Document(file_path)
             new_doc = Document()
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    translated_text = translate_text(paragraph.text)
-                    if translated_text:
-                        new_doc.add_paragraph(translated_text)
+            paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
+            for translated_text in await translate_texts(paragraphs):
+                if translated_text:
+                    new_doc.add_paragraph(translated_text)
             new_doc.save(new_file_path)
 
         elif mime_type == 'application/pdf':
             logger.info("Processing PDF document")
-            reader = PdfReader(file_path)
-            writer = PdfWriter()
-            
-            for page_num, page in enumerate(reader.pages, 1):
-                logger.info(f"Processing PDF page {page_num}/{len(reader.pages)}")
-                text = page.extract_text()
-                if text.strip():
-                    translated_text = translate_text(text)
-                    if translated_text:
-                        packet = io.BytesIO()
-                        c = canvas.Canvas(packet)
-                        c.drawString(100, 700, translated_text)
-                        c.save()
-                        packet.seek(0)
-                        new_page = PdfReader(packet).pages[0]
-                        writer.add_page(new_page)
-
-            with open(new_file_path, 'wb') as output_file:
-                writer.write(output_file)
+            await translate_pdf(file_path, new_file_path)
 
         else:  # Text-based files
             logger.info("Processing text-based file")
             translated_lines = []
             with open(file_path, 'r', encoding='utf-8') as file:
                 text = file.read()
-                translated_text = translate_text(text)
+                if file_ext.lower() in SUBTITLE_EXTENSIONS:
+                    translated_text = await translate_subtitles(text)
+                else:
+                    translated_text = await translate_text(text)
                 if translated_text is None:
                     logger.error("Translation failed")
                     return None
@@ -268,6 +775,33 @@ def translate_file(file_path, mime_type):
                 logger.error(f"Error cleaning up translation file: {cleanup_error}")
         return None
 
+@functools.lru_cache(maxsize=4096)
+def create_or_get_folder(name, parent_id):
+    """Return the ID of the named folder under parent_id, creating it if needed.
+
+    Resolved IDs are memoized for the session, so repeated uploads into the
+    same folder tree skip the Drive lookups.
+    """
+    with _folder_lock:
+        query = (f"name='{name}' and '{parent_id}' in parents and "
+                 f"mimeType='{FOLDER_MIME_TYPE}' and trashed=false")
+        results = drive_service().files().list(
+            q=query,
+            pageSize=1,
+            fields="files(id)"
+        ).execute()
+
+        folders = results.get('files', [])
+        if folders:
+            return folders[0]['id']
+
+        folder = drive_service().files().create(
+            body={'name': name, 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent_id]},
+            fields='id'
+        ).execute()
+        logger.info(f"Created folder: {name}")
+        return folder['id']
+
 def upload_file(file_path, folder_id, relative_path=None):
     """Upload file to Google Drive."""
     logger.info(f"Uploading file: {file_path}")
@@ -283,8 +817,17 @@ def upload_file(file_path, folder_id, relative_path=None):
             'parents': [current_folder_id]
         }
         
-        media = MediaFileUpload(file_path, resumable=True)
-        file = service.files().create(
+        # Small files go up in a single request; resumable sessions cost an
+        # extra round-trip and only pay off for large files
+        mimetype = (UPLOAD_MIME_TYPES.get(os.path.splitext(file_name)[1].lower())
+                    or mimetypes.guess_type(file_name)[0]
+                    or 'application/octet-stream')
+        if os.path.getsize(file_path) < SIMPLE_UPLOAD_MAX_SIZE:
+            media = MediaFileUpload(file_path, mimetype=mimetype, resumable=False)
+        else:
+            media = MediaFileUpload(file_path, mimetype=mimetype, resumable=True,
+                                    chunksize=UPLOAD_CHUNK_SIZE)
+        file = drive_service().files().create(
             body=file_metadata,
             media_body=media,
             fields='id'
@@ -296,27 +839,40 @@ def upload_file(file_path, folder_id, relative_path=None):
         logger.error(f"Error uploading file: {e}")
         return None
 
-def process_file(file_id, file_name, mime_type, folder_path=None):
-    """Process a single file."""
+async def process_file(file_id, file_name, mime_type, folder_path=None, existing_translations=None):
+    """Process a single file.
+
+    existing_translations is an optional result of find_existing_translations
+    covering this file. Returns True once the file is translated or its
+    translation already exists, and False otherwise, including when the
+    existence check failed, so the file is retried on a later scan.
+    """
     try:
         # Check if translation already exists
-        output_folder_id = os.getenv('OUTPUT_FOLDER_ID')
-        if check_existing_translation(file_name, service, output_folder_id):
+        output_folder_id = CFG.output_folder_id
+        if existing_translations is None:
+            existing_translations = await asyncio.to_thread(
+                find_existing_translations, [file_name], output_folder_id
+            )
+        if file_name in existing_translations:
+            if existing_translations[file_name] is None:
+                logger.warning(f"Skipping {file_name} for now - could not check for an existing translation")
+                return False
             logger.info(f"Skipping {file_name} - translation already exists")
             return True
 
         logger.info(f"Processing file: {file_name}")
         
         # Download and process the file
-        file_path = download_file(file_id, file_name)
+        file_path = await asyncio.to_thread(download_file, file_id, file_name)
         if not file_path:
             return False
 
-        translated_path = translate_file(file_path, mime_type)
+        translated_path = await translate_file(file_path, mime_type)
         if not translated_path:
             return False
 
-        if upload_file(translated_path, os.getenv('OUTPUT_FOLDER_ID'), folder_path):
+        if await asyncio.to_thread(upload_file, translated_path, output_folder_id, folder_path):
             logger.info(f"Successfully processed {file_name}")
             return True
         return False
@@ -325,14 +881,8 @@ def process_file(file_id, file_name, mime_type, folder_path=None):
         logger.error("Error details:", exc_info=True)
         return False
     finally:
-        # Cleanup
-        try:
-            if 'file_path' in locals() and file_path and os.path.exists(file_path):
-                os.remove(file_path)
-            if 'translated_path' in locals() and translated_path and os.path.exists(translated_path):
-                os.remove(translated_path)
-        except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
+        # Cleanup: the download and its translation share one directory
+        shutil.rmtree(os.path.join(DOWNLOADS_DIR, file_id), ignore_errors=True)
 
 def load_environment():
     """Load and validate environment variables."""
@@ -386,9 +936,189 @@ def load_environment():
         logger.error(f"Missing required environment variables for: {', '.join(missing_vars)}")
         return False
 
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key.startswith('sk-') or len(api_key) < 20:
+        logger.error("OpenAI API key appears to be invalid! Please check your .env file.")
+        return False
+
+    # Snapshot the settings used on every poll so the loop does not re-read them
+    global CFG
+    CFG = SimpleNamespace(
+        output_folder_id=os.getenv('OUTPUT_FOLDER_ID'),
+        text_folder_id=os.getenv('TEXT_TRANSLATION_FOLDER_ID'),
+        video_folder_ids=[info["folder_id"] for info in VIDEO_FOLDERS.values()],
+        translation_model=os.getenv('TRANSLATION_MODEL', DEFAULT_TRANSLATION_MODEL),
+        system_prompt=os.getenv('SYSTEM_PROMPT', "You are a helpful translation assistant."),
+        batch_min_chunks=int(os.getenv('OPENAI_BATCH_MIN_CHUNKS', 0))
+    )
+
     return True
 
-def main():
+def write_state_file(path, data):
+    """Atomically replace a state file with data."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def load_processed_files():
+    """Load the IDs of files processed by earlier runs."""
+    global _processed_log_entries
+    processed_files = set()
+    try:
+        with open(PROCESSED_FILES_PATH, encoding='utf-8') as f:
+            processed_files.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read {PROCESSED_FILES_PATH}: {e}")
+    try:
+        with open(PROCESSED_LOG_PATH, encoding='utf-8') as f:
+            entries = [line.strip() for line in f if line.strip()]
+        processed_files.update(entries)
+        _processed_log_entries = len(entries)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not read {PROCESSED_LOG_PATH}: {e}")
+    if processed_files:
+        logger.info(f"Loaded {len(processed_files)} processed files from previous runs")
+    return processed_files
+
+def mark_processed(processed_files, file_id):
+    """Record a processed file in memory and on disk.
+
+    Each ID is appended to a small log; every PROCESSED_COMPACT_EVERY
+    entries the full set is rewritten to processed.json and the log is
+    cleared, so a restart only has to replay a short log.
+    """
+    global _processed_log_entries
+    processed_files.add(file_id)
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(PROCESSED_LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(f"{file_id}\n")
+        _processed_log_entries += 1
+        if _processed_log_entries >= PROCESSED_COMPACT_EVERY:
+            write_state_file(PROCESSED_FILES_PATH, json.dumps(sorted(processed_files)))
+            os.remove(PROCESSED_LOG_PATH)
+            _processed_log_entries = 0
+    except OSError as e:
+        logger.warning(f"Could not save processed file state: {e}")
+
+def load_changes_token():
+    """Return the changes page token saved by an earlier run, if any."""
+    try:
+        with open(CHANGES_TOKEN_PATH, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Could not read {CHANGES_TOKEN_PATH}: {e}")
+        return None
+
+def save_changes_token(page_token):
+    """Persist the changes page token so a restart resumes from it."""
+    try:
+        write_state_file(CHANGES_TOKEN_PATH, page_token)
+    except OSError as e:
+        logger.warning(f"Could not save changes token: {e}")
+
+async def queue_folder_files(files_by_folder, processed_files, queued_files, text_queue, video_queue):
+    """Queue new files found in the text and video folders for processing."""
+    # Queue text folder files
+    text_folder_id = CFG.text_folder_id
+    if text_folder_id:
+        logger.info("Checking text translation folder")
+        files = files_by_folder.get(text_folder_id, [])
+        pending_files = []
+        
+        for file in files:
+            file_id = file['id']
+            file_name = file['name']
+            
+            # Skip if already processed in this session or has _AI_Translated suffix
+            if (file_id in processed_files or 
+                "_AI_Translated" in file_name or 
+                file_name.lower().endswith('_ai_translated.srt')):
+                logger.info(f"Skipping already processed file: {file_name}")
+                continue
+
+            if file_id not in queued_files:
+                pending_files.append(file)
+
+        if pending_files:
+            existing_translations = await asyncio.to_thread(
+                find_existing_translations,
+                [file['name'] for file in pending_files],
+                CFG.output_folder_id
+            )
+            for file in pending_files:
+                queued_files.add(file['id'])
+                text_queue.put_nowait((file, existing_translations))
+
+    # Queue videos in language-specific folders
+    logger.info("Checking video folders...")
+    
+    for language, folder_info in VIDEO_FOLDERS.items():
+        folder_id = folder_info.get("folder_id")
+        if not folder_id:
+            logger.warning(f"No folder ID configured for {language} videos")
+            continue
+            
+        logger.info(f"Checking {language} video folder")
+        files = files_by_folder.get(folder_id, [])
+        
+        for file in files:
+            file_id = file['id']
+            file_name = file['name']
+            
+            if (file_id not in processed_files and 
+                file_id not in queued_files and
+                is_video_file(file['mimeType'])):
+                logger.info(f"Found new video to process: {file_name} (type: {file['mimeType']})")
+                queued_files.add(file_id)
+                video_queue.put_nowait((file, folder_info))
+
+async def text_worker(work_queue, processed_files, queued_files):
+    """Translate files taken from the text queue."""
+    while True:
+        file, existing_translations = await work_queue.get()
+        try:
+            if await process_file(file['id'], file['name'], file['mimeType'],
+                                  existing_translations=existing_translations):
+                mark_processed(processed_files, file['id'])
+        finally:
+            queued_files.discard(file['id'])
+            work_queue.task_done()
+
+def process_video_file(video_processor, file, folder_info):
+    """Process a video with the calling thread's Drive service."""
+    return video_processor.process_video(file['id'], file['name'], folder_info, drive_service())
+
+async def video_worker(work_queue, processed_files, queued_files):
+    """Transcribe videos taken from the video queue."""
+    video_processor = None  # Initialize only if needed
+    while True:
+        file, folder_info = await work_queue.get()
+        try:
+            if video_processor is None:
+                video_processor = await asyncio.to_thread(VideoProcessor)
+
+            # Pass folder_info instead of language string
+            if await asyncio.to_thread(process_video_file, video_processor, file, folder_info):
+                logger.info(f"Successfully processed video: {file['name']}")
+                mark_processed(processed_files, file['id'])
+            else:
+                logger.error(f"Failed to process video: {file['name']}")
+        except Exception as e:
+            logger.error(f"Error processing video {file['name']}: {e}")
+        finally:
+            queued_files.discard(file['id'])
+            work_queue.task_done()
+
+async def main():
     logger.info("==================================================")
     logger.info("Starting Auto Google Drive Translator")
     logger.info("==================================================")
@@ -398,73 +1128,68 @@ def main():
         logger.error("Failed to load required environment variables")
         return
 
+    logger.info("Setting up Google Drive API...")
+    try:
+        await asyncio.to_thread(get_credentials)
+        logger.info("Google Drive API setup completed successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize Google Drive API: {e}")
+        return
+
     logger.info("Starting main processing loop")
-    processed_files = set()  # Keep track of processed files
+    processed_files = load_processed_files()  # Keep track of processed files
+    queued_files = set()  # Files waiting for or being processed by a worker
+    text_queue = asyncio.Queue()
+    video_queue = asyncio.Queue()
+    workers = [
+        *(asyncio.create_task(text_worker(text_queue, processed_files, queued_files))
+          for _ in range(TEXT_WORKERS)),
+        *(asyncio.create_task(video_worker(video_queue, processed_files, queued_files))
+          for _ in range(VIDEO_WORKERS))
+    ]
+    folder_ids = [CFG.text_folder_id, *CFG.video_folder_ids]
+    page_token = load_changes_token()
+    # With a saved token the changes feed covers everything since the last
+    # run, so the first full scan can wait for the regular interval
+    last_full_scan = time.monotonic() if page_token else None
+    saved_token = page_token
 
     while True:
         try:
-            # Process text folder
-            text_folder_id = os.getenv('TEXT_TRANSLATION_FOLDER_ID')
-            if text_folder_id:
-                logger.info("Checking text translation folder")
-                files = list_files(text_folder_id)
-                
-                for file in files:
-                    file_id = file['id']
-                    file_name = file['name']
-                    
-                    # Skip if already processed in this session or has _AI_Translated suffix
-                    if (file_id in processed_files or 
-                        "_AI_Translated" in file_name or 
-                        file_name.lower().endswith('_ai_translated.srt')):
-                        logger.info(f"Skipping already processed file: {file_name}")
-                        continue
-                        
-                    if process_file(file_id, file_name, file['mimeType']):
-                        processed_files.add(file_id)
-
-            # Process videos in language-specific folders
-            logger.info("Checking video folders...")
-            video_processor = None  # Initialize only if needed
-            
-            for language, folder_info in VIDEO_FOLDERS.items():
-                folder_id = folder_info.get("folder_id")
-                if not folder_id:
-                    logger.warning(f"No folder ID configured for {language} videos")
-                    continue
-                    
-                logger.info(f"Checking {language} video folder")
-                files = list_files(folder_id)
-                
-                for file in files:
-                    file_id = file['id']
-                    file_name = file['name']
-                    
-                    if (file_id not in processed_files and 
-                        is_video_file(file['mimeType'])):
-                        logger.info(f"Found new video to process: {file_name} (type: {file['mimeType']})")
-                        
-                        if video_processor is None:
-                            video_processor = VideoProcessor()
-                            
-                        # Pass folder_info instead of language string
-                        if video_processor.process_video(file_id, file_name, folder_info, service):
-                            logger.info(f"Successfully processed video: {file_name}")
-                            processed_files.add(file_id)
-                        else:
-                            logger.error(f"Failed to process video: {file_name}")
-
-            logger.info("Waiting for new files...")
-            time.sleep(60)
+
+            if last_full_scan is None or time.monotonic() - last_full_scan >= FULL_SCAN_INTERVAL:
+                # Take the changes token before listing so nothing added
+                # during the scan is missed; the rescan also retries failed files
+                logger.info("Running full folder scan")
+                page_token = await asyncio.to_thread(get_changes_start_token) or page_token
+                files_by_folder = await asyncio.to_thread(list_folders, [CFG.text_folder_id])
+                files_by_folder.update(
+                    await asyncio.to_thread(list_folders, CFG.video_folder_ids, "video/")
+                )
+                last_full_scan = time.monotonic()
+            elif page_token:
+                files_by_folder, page_token = await asyncio.to_thread(list_changes, page_token, folder_ids)
+            else:
+                files_by_folder = {}
+
+            if page_token and page_token != saved_token:
+                save_changes_token(page_token)
+                saved_token = page_token
+
+            if any(files_by_folder.values()):
+                await queue_folder_files(files_by_folder, processed_files, queued_files,
+                                         text_queue, video_queue)
+
+            await asyncio.sleep(CHANGES_POLL_INTERVAL)
 
         except Exception as e:
             logger.error(f"Error in main loop: {e}")
             logger.error("Error details:", exc_info=True)
-            time.sleep(60)
+            await asyncio.sleep(60)
 
 if __name__ == '__main__':
     try:
-        main()
+        asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Shutting down gracefully...")
         sys.exit(0)
@@ -1,17 +1,79 @@
 import os
+import functools
 import logging
+import subprocess
+import threading
 import whisperx
 import torch
 import shutil
+from pathlib import Path
 from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-from moviepy.editor import VideoFileClip
-import soundfile as sf
 import numpy as np
 
 # Configure logging
 logger = logging.getLogger(__name__)
 SAMPLE_RATE = 16000  # WhisperX expects 16kHz audio
 
+CACHE_DIR = os.path.join(os.getcwd(), "Data", "Cache")
+OUTPUT_DIR = os.path.join(os.getcwd(), "Data", "Output")
+DOWNLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+SIMPLE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+
+# Allow TF32 matmuls and let cuDNN pick the fastest kernels for the VAD model
+torch.set_float32_matmul_precision('high')
+torch.backends.cudnn.benchmark = True
+
+# Loaded WhisperX models keyed by (device, compute_type), shared by all processors
+_MODEL_CACHE: dict = {}
+# WhisperX/CTranslate2 models are not reentrant; loading and transcription
+# hold this lock so downloads and uploads can overlap with them
+_MODEL_LOCK = threading.Lock()
+
+@functools.lru_cache(None)
+def _ensure_dirs():
+    """Create the cache and output directories once per process."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    logger.info("Cache directory: %s", CACHE_DIR)
+    logger.info("Output directory: %s", OUTPUT_DIR)
+
+def _drop_page_cache(path):
+    """Ask the kernel to evict a file's pages from the page cache."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except AttributeError:
+        pass  # posix_fadvise is not available on this platform
+    except OSError as e:
+        logger.debug("Could not drop page cache for %s: %s", path, e)
+
+def _load_audio_ffmpeg(path):
+    """Decode a video's audio track to 16kHz mono float32 samples.
+
+    ffmpeg writes raw PCM to a pipe, so no intermediate WAV file is written
+    and read back. ffmpeg also does the float conversion, so the samples
+    only need copying into a writable buffer, as torch.from_numpy expects.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin",
+        "-threads", "0",
+        "-i", path,
+        "-f", "f32le",
+        "-ac", "1",
+        "-acodec", "pcm_f32le",
+        "-ar", str(SAMPLE_RATE),
+        "-"
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to extract audio: {e.stderr.decode(errors='replace')}") from e
+    return np.frombuffer(bytearray(proc.stdout), np.float32)
+
 class VideoProcessor:
     def __init__(self):
         # Check CUDA availability
@@ -21,35 +83,35 @@ class VideoProcessor:
         else:
             self.device = "cpu"
             logger.info("CUDA is not available - using CPU")
-            os.environ["CUDA_VISIBLE_DEVICES"] = "-1"  # Force CPU
 
-        self.compute_type = "float32"
-
-        # Configure processing environment
-        os.environ["CUDA_VISIBLE_DEVICES"] = "-1"  # Force CPU
-        self.device = "cpu"
-        self.compute_type = "float32"
+        # FP16 on the GPU, dynamically quantized int8 on the CPU
+        self.compute_type = "float16" if self.device == "cuda" else "int8"
+        # VAD segments transcribed per encoder batch
+        self.batch_size = 32 if self.device == "cuda" else 16
 
         # Setup directories
-        self.cache_dir = os.path.join(os.getcwd(), "Data", "Cache")
-        self.output_dir = os.path.join(os.getcwd(), "Data", "Output")
-
-        os.makedirs(self.cache_dir, exist_ok=True)
-        os.makedirs(self.output_dir, exist_ok=True)
-
-        logger.info(f"Cache directory: {self.cache_dir}")
-        logger.info(f"Output directory: {self.output_dir}")
+        _ensure_dirs()
+        self.cache_dir = CACHE_DIR
+        self.output_dir = OUTPUT_DIR
 
         try:
-            logger.info("Loading WhisperX model...")
-            self.model = whisperx.load_model(
-                "large-v2",
-                device=self.device,
-                compute_type=self.compute_type,
-            )
-            logger.info(f"WhisperX initialized successfully on {self.device}")
+            model_key = (self.device, self.compute_type)
+            with _MODEL_LOCK:
+                if model_key not in _MODEL_CACHE:
+                    logger.info("Loading WhisperX model...")
+                    _MODEL_CACHE[model_key] = whisperx.load_model(
+                        "large-v2",
+                        device=self.device,
+                        compute_type=self.compute_type,
+                        threads=os.cpu_count() if self.device == "cpu" else 4,
+                        # On a tmpfs such as /dev/shm the memory-mapped weights
+                        # stay resident across restarts
+                        download_root=os.getenv('WHISPER_MODEL_DIR') or None,
+                    )
+            self.model = _MODEL_CACHE[model_key]
+            logger.info("WhisperX initialized successfully on %s", self.device)
         except Exception as e:
-            logger.error(f"Error initializing WhisperX model: {e}")
+            logger.error("Error initializing WhisperX model: %s", e)
             self.model = None
 
     def process_video(self, file_id, file_name, language_info, service):
@@ -67,21 +129,35 @@ class VideoProcessor:
             # Convert language code to string if it's not already
             lang_code = str(lang_code)
             
-            logger.info(f"Processing video in {language_info} (code: {lang_code})")
+            logger.info("Processing video in %s (code: %s)", language_info, lang_code)
+
+            # Skip the download and transcription if a transcript already exists
+            if self.check_existing_translation(file_name, service,
+                                               os.getenv('OUTPUT_FOLDER_ID'),
+                                               os.getenv('TEXT_TRANSLATION_FOLDER_ID')):
+                logger.info("Skipping %s: transcript already exists", file_name)
+                return True
             
-            # Download video to cache
-            video_path = os.path.join(self.cache_dir, file_name)
+            # Download video to cache, keyed on the file ID so same-named
+            # videos from different folders never share cache files
+            video_path = os.path.join(self.cache_dir, f"{file_id}_{file_name}")
             self._download_file(file_id, video_path, service)
             
             # Create SRT file
             srt_path = self.transcribe_video(video_path, lang_code)
             if not srt_path:
                 raise Exception("Failed to create SRT file")
+            srt_name = os.path.splitext(file_name)[0] + ".srt"
 
-            # Save a copy in local output directory
-            local_output_path = os.path.join(self.output_dir, os.path.basename(srt_path))
-            shutil.copy2(srt_path, local_output_path)
-            logger.info(f"Saved local copy to: {local_output_path}")
+            # Move the SRT into the local output directory; a rename on the
+            # same filesystem, a copy only across filesystems
+            local_output_path = os.path.join(self.output_dir, srt_name)
+            try:
+                os.replace(srt_path, local_output_path)
+            except OSError:
+                shutil.move(srt_path, local_output_path)
+            srt_path = None  # Nothing left in the cache to clean up
+            logger.info("Saved local copy to: %s", local_output_path)
 
             # Determine Google Drive destination based on language
             if lang_code.lower() == 'nl':  # Dutch
@@ -89,20 +165,20 @@ class VideoProcessor:
                 output_folder_id = os.getenv('OUTPUT_FOLDER_ID')
                 if not output_folder_id:
                     raise Exception("Output folder ID not configured")
-                self._upload_srt(srt_path, output_folder_id, service)
+                self._upload_srt(local_output_path, output_folder_id, service, srt_name)
                 logger.info("Dutch SRT uploaded to Output folder")
             else:
                 # Non-Dutch files go to input folder for translation
                 input_folder_id = os.getenv('TEXT_TRANSLATION_FOLDER_ID')
                 if not input_folder_id:
                     raise Exception("Input folder ID not configured")
-                self._upload_srt(srt_path, input_folder_id, service)
-                logger.info(f"{lang_code} SRT uploaded to Input folder for translation")
+                self._upload_srt(local_output_path, input_folder_id, service, srt_name)
+                logger.info("%s SRT uploaded to Input folder for translation", lang_code)
 
             return True
             
         except Exception as e:
-            logger.error(f"Error processing video {file_name}: {e}")
+            logger.error("Error processing video %s: %s", file_name, e)
             return False
             
         finally:
@@ -110,45 +186,43 @@ class VideoProcessor:
 
     def transcribe_video(self, video_path, language_code=None):
         """Extract audio and transcribe to SRT."""
-        audio_path = None
         try:
             if not os.path.isfile(video_path):
                 raise FileNotFoundError(f"Video file not found: {video_path}")
 
-            # Extract audio
-            logger.info("Extracting audio...")
-            video = VideoFileClip(video_path)
-            audio_path = os.path.join(self.cache_dir, os.path.splitext(os.path.basename(video_path))[0] + ".wav")
-            video.audio.write_audiofile(audio_path, codec="pcm_s16le", fps=SAMPLE_RATE)
-            video.close()
+            stem = os.path.splitext(os.path.basename(video_path))[0]
+            srt_path = os.path.join(self.cache_dir, stem + ".srt")
 
             if not self.model:
                 logger.error("WhisperX model not available")
                 return None
 
-            # Prepare audio in correct format
-            audio_data = self.prepare_audio(audio_path)
+            # Extract audio
+            logger.info("Extracting audio...")
+            audio_data = _load_audio_ffmpeg(video_path)
+            # The video is not read again; keep its pages from evicting the model
+            _drop_page_cache(video_path)
+            logger.info("Loaded audio: %.1fs", len(audio_data) / SAMPLE_RATE)
 
             # Run transcription
             logger.info("Starting transcription...")
             try:
                 # Add more detailed logging for the transcription process
-                logger.info(f"Transcribing with language: {language_code}")
-                result = self.model.transcribe(
-                    audio_data,
-                    batch_size=1,
-                    language=language_code
-                )
-                
-                logger.info(f"Raw transcription result: {result}")  # Log the raw result
+                logger.info("Transcribing with language: %s", language_code)
+                with _MODEL_LOCK, torch.inference_mode():
+                    result = self.model.transcribe(
+                        audio_data,
+                        batch_size=self.batch_size,
+                        language=language_code
+                    )
 
                 if not isinstance(result, dict):
-                    logger.error(f"Unexpected result type: {type(result)}")
+                    logger.error("Unexpected result type: %s", type(result))
                     return None
 
                 if 'segments' not in result:
                     logger.error("No segments found in transcription result")
-                    logger.error(f"Available keys in result: {result.keys()}")
+                    logger.error("Available keys in result: %s", result.keys())
                     return None
 
                 segments = result['segments']
@@ -156,55 +230,28 @@ class VideoProcessor:
                     logger.warning("No segments were transcribed")
                     return None
 
-                logger.info(f"Transcription completed with {len(segments)} segments")
+                logger.info("Transcription completed with %d segments", len(segments))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("First segment: %s", segments[:1])
 
                 # Write SRT
-                srt_path = os.path.join(self.cache_dir, os.path.splitext(os.path.basename(video_path))[0] + ".srt")
                 if self._write_srt(segments, srt_path):
-                    logger.info(f"SRT file created successfully: {srt_path}")
+                    logger.info("SRT file created successfully: %s", srt_path)
                     return srt_path
                 else:
                     logger.error("Failed to write SRT file")
                     return None
 
             except Exception as e:
-                logger.error(f"Transcription failed: {str(e)}")
+                logger.error("Transcription failed: %s", e)
                 logger.exception("Detailed transcription error:")
                 return None
 
         except Exception as e:
-            logger.error(f"Error in transcribe_video: {str(e)}")
+            logger.error("Error in transcribe_video: %s", e)
             logger.exception("Detailed error:")
             return None
 
-        finally:
-            if audio_path and os.path.exists(audio_path):
-                try:
-                    os.remove(audio_path)
-                    logger.info("Cleaned up temporary audio file")
-                except Exception as e:
-                    logger.error(f"Error cleaning up audio file: {str(e)}")
-
-    def prepare_audio(self, audio_path):
-        """Prepare audio data in the correct format for WhisperX."""
-        logger.info(f"Loading audio file: {audio_path}")
-
-        # Load audio with soundfile
-        audio_data, sr = sf.read(audio_path)
-        logger.info(f"Original audio: shape={audio_data.shape}, sr={sr}, dtype={audio_data.dtype}")
-
-        # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = audio_data.mean(axis=1)
-            logger.info("Converted stereo to mono")
-
-        # Ensure float32 dtype
-        if audio_data.dtype != np.float32:
-            audio_data = audio_data.astype(np.float32)
-
-        logger.info(f"Prepared audio shape: {audio_data.shape}")
-        return audio_data
-
     def _write_srt(self, segments, output_path):
         """Write segments to SRT file."""
         try:
@@ -212,32 +259,28 @@ class VideoProcessor:
                 logger.warning("No segments to write to SRT file")
                 return False
 
-            with open(output_path, "w", encoding="utf-8") as f:
-                for i, segment in enumerate(segments, 1):
-                    start_time = self._format_timestamp(segment["start"])
-                    end_time = self._format_timestamp(segment["end"])
-                    text = segment["text"].strip()
-
-                    if not text:  # Skip empty segments
-                        continue
-
-                    f.write(f"{i}\n")
-                    f.write(f"{start_time} --> {end_time}\n")
-                    f.write(f"{text}\n\n")
+            # Strip each text once and skip empty segments, numbering cues without gaps
+            cues = [(segment, text) for segment in segments if (text := segment["text"].strip())]
+            parts = [
+                f"{i}\n{self._format_timestamp(segment['start'])} --> "
+                f"{self._format_timestamp(segment['end'])}\n{text}\n\n"
+                for i, (segment, text) in enumerate(cues, 1)
+            ]
+            Path(output_path).write_text("".join(parts), encoding="utf-8")
 
             return True
 
         except Exception as e:
-            logger.error(f"Error writing SRT file: {e}")
+            logger.error("Error writing SRT file: %s", e)
             return False
 
     def _format_timestamp(self, seconds):
         """Format time in SRT format (HH:MM:SS,mmm)."""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = seconds % 60
-        milliseconds = int((seconds % 1) * 1000)
-        seconds = int(seconds)
+        # Round to whole milliseconds once, then split with integer math only
+        milliseconds = int(seconds * 1000 + 0.5)
+        hours, milliseconds = divmod(milliseconds, 3600000)
+        minutes, milliseconds = divmod(milliseconds, 60000)
+        seconds, milliseconds = divmod(milliseconds, 1000)
         return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
 
     def check_existing_translation(self, file_name, service, output_folder_id, translation_folder_id):
@@ -248,24 +291,37 @@ class VideoProcessor:
             f"{base_without_ext}.srt",                # Original name in translation queue
         ]
 
-        logger.info(f"Checking for existing translations of {file_name}...")
+        logger.info("Checking for existing translations of %s...", file_name)
+
+        # One query per folder matching either name, sent together as one batch
+        found = []
 
+        def handle_response(request_id, response, exception):
+            if exception:
+                logger.error("Error checking folder: %s", exception)
+                return
+            names = {f['name'] for f in response.get('files', [])}
+            found.extend(names & set(possible_names))
+
+        name_query = " or ".join(f"name = '{name}'" for name in possible_names)
+        batch = service.new_batch_http_request(callback=handle_response)
         for folder_id in [output_folder_id, translation_folder_id]:
-            for name in possible_names:
-                query = f"name = '{name}' and '{folder_id}' in parents and trashed = false"
-                try:
-                    results = service.files().list(
-                        q=query,
-                        fields="files(id, name)",
-                        supportsAllDrives=True,
-                        includeItemsFromAllDrives=True
-                    ).execute()
-
-                    if results.get('files', []):
-                        logger.info(f"Found existing file in folder: {name}")
-                        return True
-                except Exception as e:
-                    logger.error(f"Error checking folder: {e}")
+            if not folder_id:
+                continue
+            batch.add(service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false and ({name_query})",
+                fields="files(name)",
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ))
+        try:
+            batch.execute()
+        except Exception as e:
+            logger.error("Error checking folders: %s", e)
+
+        if found:
+            logger.info("Found existing file in folder: %s", found[0])
+            return True
 
         logger.info("No existing translations found, proceeding with transcription")
         return False
@@ -275,33 +331,45 @@ class VideoProcessor:
         try:
             request = service.files().get_media(fileId=file_id)
             with open(destination_path, 'wb') as f:
-                downloader = MediaIoBaseDownload(f, request)
+                downloader = MediaIoBaseDownload(f, request, chunksize=DOWNLOAD_CHUNK_SIZE)
                 done = False
+                last_logged = -1
                 while not done:
                     status, done = downloader.next_chunk()
-                    logger.info(f"Download progress: {int(status.progress() * 100)}%")
-            logger.info(f"Downloaded file to: {destination_path}")
+                    progress = int(status.progress() * 100)
+                    if progress // 10 > last_logged:  # Log every 10%
+                        last_logged = progress // 10
+                        logger.info("Download progress: %d%%", progress)
+            logger.info("Downloaded file to: %s", destination_path)
         except Exception as e:
-            logger.error(f"Error downloading file: {e}")
+            logger.error("Error downloading file: %s", e)
             raise
 
-    def _upload_srt(self, srt_path, folder_id, service):
-        """Upload SRT file to Google Drive."""
+    def _upload_srt(self, srt_path, folder_id, service, name=None):
+        """Upload SRT file to Google Drive, as name if given."""
         try:
             file_metadata = {
-                'name': os.path.basename(srt_path),
+                'name': name or os.path.basename(srt_path),
                 'parents': [folder_id]
             }
-            media = MediaFileUpload(srt_path, resumable=True)
-            upload_response = service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
-            media._fd.close()
-            logger.info(f"Successfully uploaded SRT to folder: {os.path.basename(srt_path)}")
+            # SRT files are small, so they normally go up in a single request
+            media = MediaFileUpload(
+                srt_path,
+                mimetype='application/x-subrip',
+                resumable=os.path.getsize(srt_path) > SIMPLE_UPLOAD_MAX_SIZE,
+                chunksize=UPLOAD_CHUNK_SIZE
+            )
+            try:
+                upload_response = service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                ).execute()
+            finally:
+                media.stream().close()
+            logger.info("Successfully uploaded SRT to folder: %s", file_metadata['name'])
         except Exception as e:
-            logger.error(f"Error uploading SRT file: {e}")
+            logger.error("Error uploading SRT file: %s", e)
             raise
 
     def _cleanup_files(self, *file_paths):
@@ -310,32 +378,6 @@ class VideoProcessor:
             if file_path and os.path.exists(file_path):
                 try:
                     os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
+                    logger.info("Cleaned up file: %s", file_path)
                 except Exception as e:
-                    logger.error(f"Error cleaning up file: {e}")
-
-def process_video_files(folder_info, service):
-    """Process video files in a specific language folder."""
-    folder_id = folder_info.get("folder_id")
-    language = folder_info.get("code")
-    
-    if not folder_id:
-        logger.warning(f"No folder ID configured for {language} videos")
-        return
-        
-    logger.info(f"Checking {language} video folder")
-    files = list_files(folder_id)
-    
-    for file in files:
-        if is_video_file(file.get('mimeType', '')):
-            video_processor = VideoProcessor()
-            success = video_processor.process_video(
-                file['id'],
-                file['name'],
-                folder_info,  # Pass the complete folder info dict
-                service
-            )
-            if success:
-                logger.info(f"Successfully processed video: {file['name']}")
-            else:
-                logger.error(f"Failed to process video: {file['name']}")
+                    logger.error("Error cleaning up file: %s", e)